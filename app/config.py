@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings
 
@@ -17,10 +17,59 @@ class Settings(BaseSettings):
     
     # rate limiting
     RATE_LIMIT: str = "10/minute"
+    # limits storage uri - use redis://host:port when running multiple workers
+    RATE_LIMIT_STORAGE_URI: str = "boundedmemory://"
+    # max client keys tracked by boundedmemory:// - each key holds a counter,
+    # an expiry and a lock, ~35mb at 100k (more with moving-window)
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    # fixed-window keeps one counter per client, the cheapest limits strategy
+    RATE_LIMIT_STRATEGY: str = "fixed-window"
     
     # validation limits
     MAX_PROMPT_LENGTH: int = 10000
     
+    # prompts shorter than this (or only whitespace) pass without any checks
+    GUARDRAIL_MIN_PROMPT_LENGTH: int = 4
+    
+    # prompts up to this length that normalization leaves unchanged and that
+    # contain none of the suspicious tokens skip tier 2 (tier 1 still runs),
+    # 0 disables
+    GUARDRAIL_FAST_SKIP_MAX_LENGTH: int = 2048
+    # plain ascii prompts (words and punctuation only) up to this length may
+    # also skip tier 2 when normalization changes them, e.g. upper case,
+    # 0 disables
+    GUARDRAIL_FAST_SKIP_PLAIN_MAX_LENGTH: int = 200
+    # substrings (matched on the normalized prompt) that send a prompt to
+    # tier 2, an empty list disables the skip
+    GUARDRAIL_SUSPICIOUS_TOKENS: List[str] = [
+        # instruction override
+        "ignore", "disregard", "forget", "override", "bypass", "instruction",
+        # roleplay and jailbreaks
+        "you are now", "act as", "pretend", "roleplay", "role play", "persona",
+        "jailbreak", "dan", "developer mode", "unfiltered", "uncensored",
+        "no restrictions", "without restrictions", "hypothetical", "evil",
+        # prompt and secret extraction
+        "system prompt", "reveal", "show me your", "repeat the", "hidden",
+        "secret", "confidential", "api key", "password", "credential", "token",
+        # PII
+        "ssn", "social security", "credit card", "bank account", "passport",
+        # encodings and payloads
+        "base64", "encode", "decode", "exploit", "malware",
+    ]
+    
+    # longer prompts are normalized and tier 1 checked on a worker thread
+    GUARDRAIL_TIER1_THREAD_MIN_LENGTH: int = 1024
+    
+    # while a judge call for an api key is in flight, further tier 2 checks
+    # for that key are collected for up to this long and judged in one gemini
+    # call. a check with nothing in flight is sent at once. batch size 1
+    # disables batching
+    GUARDRAIL_BATCH_WINDOW_MS: float = 50.0
+    GUARDRAIL_BATCH_MAX_SIZE: int = 8
+    
+    # verdicts kept for repeat prompts, 0 disables the cache
+    GUARDRAIL_CACHE_SIZE: int = 2048
+    
     # environment
     ENVIRONMENT: str = "development"
     
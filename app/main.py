@@ -1,9 +1,17 @@
+import hashlib
+import logging
+import logging.handlers
+import math
+import queue
+import sys
+import time
+import orjson
 import structlog
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, HTMLResponse, Response
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
@@ -11,14 +19,43 @@ from app.config import settings
 from app.routers import health, prompt
 
 
+def _orjson_dumps(obj, **kwargs) -> str:
+    """orjson serializer returning str, as logging formatters require"""
+    return orjson.dumps(obj, **kwargs).decode()
+
+
 # setup structured logging
+# structlog hands its event dicts to stdlib logging, so structlog and plain
+# stdlib loggers share one handler chain and render the same json lines
 structlog.configure(
     processors=[
+        structlog.processors.add_log_level,
         structlog.processors.TimeStamper(fmt="iso"),
+        structlog.stdlib.ProcessorFormatter.wrap_for_formatter
+    ],
+    logger_factory=structlog.stdlib.LoggerFactory(),
+    # levels below info become no-op methods, and bound loggers are built once
+    wrapper_class=structlog.make_filtering_bound_logger(logging.INFO),
+    cache_logger_on_first_use=True
+)
+
+_json_formatter = structlog.stdlib.ProcessorFormatter(
+    foreign_pre_chain=[
         structlog.processors.add_log_level,
-        structlog.processors.JSONRenderer()
-    ]
+        structlog.processors.TimeStamper(fmt="iso"),
+    ],
+    processors=[
+        structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+        structlog.processors.JSONRenderer(serializer=_orjson_dumps),
+    ],
 )
+
+# direct stdout handler, used outside the app lifespan (imports, cli tools)
+_stdout_handler = logging.StreamHandler(sys.stdout)
+_stdout_handler.setFormatter(_json_formatter)
+logging.basicConfig(level=logging.INFO, handlers=[_stdout_handler])
+# httpx logs every outbound gemini call at info, which duplicates our own events
+logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = structlog.get_logger()
 
 
@@ -28,13 +65,37 @@ async def lifespan(app: FastAPI):
     startup and shutdown events
     """
     # startup
+    # while serving, log calls only render and enqueue the record - the
+    # blocking stdout write happens on the listener thread, off the event loop
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(_json_formatter)
+    log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    
+    root_logger = logging.getLogger()
+    root_logger.removeHandler(_stdout_handler)
+    root_logger.addHandler(queue_handler)
+    log_listener.start()
+    
     logger.info("starting llm guardrail proxy")
+    
+    # dashboard html is read once and served from memory
+    with open("app/static/index.html", "rb") as f:
+        app.state.index_html = f.read()
+    app.state.index_etag = f'"{hashlib.sha256(app.state.index_html).hexdigest()[:32]}"'
+    
     logger.info("llm guardrail proxy started", environment=settings.ENVIRONMENT)
     
     yield
     
     # shutdown
     logger.info("shutting down llm guardrail proxy")
+    await prompt.gemini_client.aclose()
+    
+    # flush queued records and go back to writing stdout directly
+    log_listener.stop()
+    root_logger.removeHandler(queue_handler)
+    root_logger.addHandler(_stdout_handler)
 
 
 # create fastapi app
@@ -61,26 +122,54 @@ app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
 # root route serving the dashboard
 @app.get("/")
-async def read_root():
+async def read_root(request: Request):
     """
-    serve the main dashboard html
+    serve the main dashboard html from memory
+    clients revalidate with the etag and get a 304 when it hasn't changed
     """
-    return FileResponse("app/static/index.html")
+    etag = request.app.state.index_etag
+    headers = {"Cache-Control": "public, max-age=300", "ETag": etag}
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    
+    return HTMLResponse(content=request.app.state.index_html, headers=headers)
 
 # exception handlers
 @app.exception_handler(RateLimitExceeded)
 async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
     """
     handle rate limit exceeded errors
+    sends retry-after and ratelimit headers so clients back off until the
+    window resets instead of retrying straight away
     """
     logger.warning("rate limit exceeded", path=request.url.path)
+    
+    headers = {}
+    view_rate_limit = getattr(request.state, "view_rate_limit", None)
+    if view_rate_limit is not None:
+        limit, limit_args = view_rate_limit
+        reset_time, remaining = request.app.state.limiter.limiter.get_window_stats(
+            limit, *limit_args
+        )
+        reset_seconds = max(1, math.ceil(reset_time - time.time()))
+        headers = {
+            "Retry-After": str(reset_seconds),
+            "RateLimit-Limit": str(limit.amount),
+            "RateLimit-Remaining": str(remaining),
+            "RateLimit-Reset": str(reset_seconds)
+        }
+    
     return JSONResponse(
         status_code=429,
         content={
             "success": False,
             "error": "rate limit exceeded",
+            "code": "rate_limited",
             "detail": str(exc.detail)
-        }
+        },
+        headers=headers
     )
 
 
@@ -1,20 +1,28 @@
 import asyncio
-from typing import Optional, Dict, Any, List
-import structlog
+import logging
+from typing import Annotated, Optional, Dict, Any, List, Literal, Tuple, Awaitable, Union
+import msgspec
 from fastapi import APIRouter, HTTPException, Request
-from pydantic import BaseModel, Field, SecretStr
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ConfigDict, Field, SecretStr
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 from app.config import settings
 from app.services.guardrail import GuardrailService
 from app.services.gemini_client import GeminiClient, ServiceUnavailableError
+# registers the boundedmemory:// rate limit storage scheme
+from app.services import rate_limit_storage  # noqa: F401
 
 
-logger = structlog.get_logger()
+logger = logging.getLogger(__name__)
 
 # initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=settings.RATE_LIMIT_STORAGE_URI,
+    strategy=settings.RATE_LIMIT_STRATEGY
+)
 
 # initialize services
 guardrail_service = GuardrailService()
@@ -23,8 +31,8 @@ gemini_client = GeminiClient()
 router = APIRouter(prefix="/api/v1", tags=["prompt"])
 
 
-# valid model options
-VALID_MODELS = [
+# valid model options - frozenset for constant time membership checks
+VALID_MODELS = frozenset({
     # Gemini 3 models (preview)
     "gemini-3-pro-preview",
     "gemini-3-flash-preview",
@@ -38,26 +46,20 @@ VALID_MODELS = [
     # Legacy aliases
     "gemini-flash-latest",
     "gemini-pro-latest"
-]
+})
 
-
-from enum import Enum
-
-
-class MessageRole(str, Enum):
-    """valid roles for conversation messages"""
-    user = "user"
-    assistant = "assistant"
-
-
-class ConversationMessage(BaseModel):
+class ConversationMessage(msgspec.Struct, frozen=True):
     """a single message in the conversation"""
-    role: MessageRole = Field(..., description="role of the message sender (user/assistant)")
-    content: str = Field(..., description="content of the message")
+    # role of the message sender
+    role: Literal["user", "assistant"]
+    # content of the message
+    content: str
 
 
 class PromptRequest(BaseModel):
     """request model for prompt endpoint"""
+    model_config = ConfigDict(frozen=True, revalidate_instances="never")
+
     prompt: str = Field(
         ..., 
         max_length=settings.MAX_PROMPT_LENGTH, 
@@ -69,35 +71,114 @@ class PromptRequest(BaseModel):
     )
 
 
-class ChatRequest(BaseModel):
-    """request model for chat endpoint with conversation history"""
-    message: str = Field(
-        ..., 
-        max_length=settings.MAX_PROMPT_LENGTH, 
-        description="user message to process"
-    )
-    api_key: SecretStr = Field(
-        ...,
-        description="gemini api key provided by user"
-    )
-    model: str = Field(
-        default="gemini-2.0-flash",
-        description="gemini model to use"
-    )
-    conversation_history: List[ConversationMessage] = Field(
-        default=[],
-        description="previous conversation messages for context"
-    )
+class ChatRequest(msgspec.Struct, frozen=True):
+    """
+    request body for chat endpoint with conversation history
+    decoded with msgspec rather than pydantic since the history can be long.
+    api_key is a plain str here, so never log or repr a ChatRequest
+    """
+    # user message to process
+    message: Annotated[str, msgspec.Meta(max_length=settings.MAX_PROMPT_LENGTH)]
+    # gemini api key provided by user
+    api_key: str
+    # gemini model to use
+    model: str = "gemini-2.0-flash"
+    # previous conversation messages for context
+    conversation_history: List[ConversationMessage] = msgspec.field(default_factory=list)
+
+
+# reusable decoder for chat request bodies
+_chat_request_decoder = msgspec.json.Decoder(ChatRequest)
+
+
+def _chat_request_schema() -> Dict[str, Any]:
+    """
+    json schema of ChatRequest for the openapi docs - the chat endpoint reads
+    the raw body, so fastapi can't generate it. msgspec's $defs refs are
+    inlined since openapi resolves refs against the whole document
+    """
+    (schema,), defs = msgspec.json.schema_components([ChatRequest])
+    
+    def inline(node: Any) -> Any:
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return inline(defs[node["$ref"].rsplit("/", 1)[-1]])
+            return {key: inline(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [inline(value) for value in node]
+        return node
+    
+    return inline(schema)
 
 
 class PromptResponse(BaseModel):
-    """response model for prompt endpoint"""
+    """
+    response model for prompt endpoint
+    built server side with model_construct, so never revalidated
+    """
+    model_config = ConfigDict(frozen=True, revalidate_instances="never")
+
     success: bool = Field(..., description="whether the request was successful")
     response: Optional[str] = Field(None, description="generated response from gemini")
     guardrail: Dict[str, Any] = Field(..., description="guardrail check results")
     error: Optional[str] = Field(None, description="error message if failed")
 
 
+# gemini failures with a dedicated status code, checked in order
+# (exception type, status code, log event, client error) - anything else is a 500
+_GEMINI_ERRORS = (
+    (ServiceUnavailableError, 503, "gemini service unavailable", "gemini service temporarily unavailable"),
+    (TimeoutError, 504, "gemini request timeout", "gemini request timed out"),
+)
+
+
+async def _run_guardrail(text: str, api_key: str) -> Tuple[bool, Dict[str, Any]]:
+    """
+    run the guardrail check under the guardrail timeout
+    returns (completed, result) - completed is False if the check timed out
+    """
+    try:
+        async with asyncio.timeout(settings.GUARDRAIL_TIMEOUT_SECONDS):
+            return True, await guardrail_service.check_prompt(text, api_key=api_key)
+    except TimeoutError:
+        logger.error("guardrail check timeout")
+        return False, {"safe": False, "reason": "guardrail check timeout"}
+
+
+async def _run_gemini(call: Awaitable[str]) -> Tuple[bool, Union[str, Exception]]:
+    """
+    await a gemini call
+    returns (ok, response text) on success or (False, exception) on failure
+    """
+    try:
+        return True, await call
+    except Exception as e:
+        return False, e
+
+
+def _gemini_error(exc: Exception, guardrail_result: Dict[str, Any]) -> HTTPException:
+    """
+    map a failed gemini call to the http error returned to the client
+    fails closed - unknown errors become a 500
+    """
+    for exc_type, status_code, log_event, error in _GEMINI_ERRORS:
+        if isinstance(exc, exc_type):
+            logger.error(log_event)
+            break
+    else:
+        logger.error("gemini request failed error=%s", exc)
+        status_code, error = 500, f"failed to generate response: {str(exc)}"
+    
+    return HTTPException(
+        status_code=status_code,
+        detail={
+            "success": False,
+            "guardrail": guardrail_result,
+            "error": error
+        }
+    )
+
+
 @router.post("/prompt", response_model=PromptResponse)
 @limiter.limit(settings.RATE_LIMIT)
 async def process_prompt(request: Request, prompt_request: PromptRequest):
@@ -110,230 +191,149 @@ async def process_prompt(request: Request, prompt_request: PromptRequest):
     3. if guardrail fails -> return 400 with failure reason
     4. if guardrail passes -> call gemini and return response
     5. on any exception -> fail closed, return 500
+       (unexpected errors fall through to the global exception handler)
     """
     prompt = prompt_request.prompt
+    api_key = prompt_request.api_key.get_secret_value()
     
-    try:
-        # validate prompt length
-        if len(prompt) > settings.MAX_PROMPT_LENGTH:
-            logger.warning("prompt too long", length=len(prompt))
-            return PromptResponse(
-                success=False,
-                guardrail={"safe": False, "reason": "prompt exceeds maximum length"},
-                error="prompt too long"
-            )
-        
-        # run guardrail check with timeout
-        try:
-            guardrail_result = await asyncio.wait_for(
-                guardrail_service.check_prompt(prompt, api_key=prompt_request.api_key.get_secret_value()),
-                timeout=settings.GUARDRAIL_TIMEOUT_SECONDS
-            )
-        except asyncio.TimeoutError:
-            logger.error("guardrail check timeout")
-            return PromptResponse(
-                success=False,
-                guardrail={"safe": False, "reason": "guardrail check timeout"},
-                error="security check timed out"
-            )
-        
-        # if guardrail fails, return 400
-        if not guardrail_result['safe']:
-            logger.warning("guardrail blocked prompt", reason=guardrail_result['reason'])
-            raise HTTPException(
-                status_code=400,
-                detail={
-                    "success": False,
-                    "guardrail": guardrail_result,
-                    "error": "prompt blocked by security guardrails"
-                }
-            )
-        
-        # guardrail passed, call gemini
-        try:
-            response_text = await gemini_client.generate(
-                prompt,
-                timeout=settings.GEMINI_TIMEOUT_SECONDS,
-                api_key=prompt_request.api_key.get_secret_value()
-            )
-            
-            logger.info("prompt processed successfully")
-            return PromptResponse(
-                success=True,
-                response=response_text,
-                guardrail=guardrail_result
-            )
-            
-        except ServiceUnavailableError:
-            logger.error("gemini service unavailable")
-            raise HTTPException(
-                status_code=503,
-                detail={
-                    "success": False,
-                    "guardrail": guardrail_result,
-                    "error": "gemini service temporarily unavailable"
-                }
-            )
-        
-        except asyncio.TimeoutError:
-            logger.error("gemini request timeout")
-            raise HTTPException(
-                status_code=504,
-                detail={
-                    "success": False,
-                    "guardrail": guardrail_result,
-                    "error": "gemini request timed out"
-                }
-            )
-        
-        except Exception as e:
-            logger.error("gemini request failed", error=str(e))
-            # fail closed - return error
-            raise HTTPException(
-                status_code=500,
-                detail={
-                    "success": False,
-                    "guardrail": guardrail_result,
-                    "error": f"failed to generate response: {str(e)}"
-                }
-            )
+    # validate prompt length
+    if len(prompt) > settings.MAX_PROMPT_LENGTH:
+        logger.warning("prompt too long length=%d", len(prompt))
+        return PromptResponse.model_construct(
+            success=False,
+            guardrail={"safe": False, "reason": "prompt exceeds maximum length"},
+            error="prompt too long"
+        )
     
-    except HTTPException:
-        # re-raise http exceptions
-        raise
+    # run guardrail check with timeout
+    completed, guardrail_result = await _run_guardrail(prompt, api_key)
+    if not completed:
+        return PromptResponse.model_construct(
+            success=False,
+            guardrail=guardrail_result,
+            error="security check timed out"
+        )
     
-    except Exception as e:
-        # catch any unexpected errors and fail closed
-        logger.error("unexpected error processing prompt", error=str(e))
+    # if guardrail fails, return 400
+    if not guardrail_result['safe']:
+        logger.warning("guardrail blocked prompt reason=%s", guardrail_result['reason'])
         raise HTTPException(
-            status_code=500,
+            status_code=400,
             detail={
                 "success": False,
-                "guardrail": {"safe": False, "reason": "unexpected error"},
-                "error": f"internal error: {str(e)}"
+                "guardrail": guardrail_result,
+                "error": "prompt blocked by security guardrails"
             }
         )
+    
+    # guardrail passed, call gemini
+    ok, outcome = await _run_gemini(
+        gemini_client.generate(
+            prompt,
+            timeout=settings.GEMINI_TIMEOUT_SECONDS,
+            api_key=api_key
+        )
+    )
+    if not ok:
+        raise _gemini_error(outcome, guardrail_result)
+    
+    logger.info("prompt processed successfully")
+    return PromptResponse.model_construct(
+        success=True,
+        response=outcome,
+        guardrail=guardrail_result
+    )
 
 
-@router.post("/chat", response_model=PromptResponse)
+@router.post(
+    "/chat",
+    response_model=PromptResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": _chat_request_schema()}}
+        }
+    }
+)
 @limiter.limit(settings.RATE_LIMIT)
-async def process_chat(request: Request, chat_request: ChatRequest):
+async def process_chat(request: Request):
     """
     chat endpoint for processing messages with conversation history
     
     flow:
-    1. validate message length and model
+    1. decode and validate the body, message length and model
     2. run guardrail check on the current message
     3. if guardrail fails -> return 400 with failure reason
     4. if guardrail passes -> call gemini with conversation context
     5. on any exception -> fail closed, return 500
+       (unexpected errors fall through to the global exception handler)
     """
+    try:
+        chat_request = _chat_request_decoder.decode(await request.body())
+    except msgspec.ValidationError as e:
+        # same 422 body fastapi sends for the pydantic endpoints
+        raise RequestValidationError([
+            {"type": "value_error", "loc": ("body",), "msg": str(e), "input": None}
+        ])
+    except msgspec.DecodeError as e:
+        raise RequestValidationError([
+            {"type": "json_invalid", "loc": ("body",), "msg": str(e), "input": None}
+        ])
+    
     message = chat_request.message
     model = chat_request.model
+    api_key = chat_request.api_key
     
     # validate model
     if model not in VALID_MODELS:
         model = "gemini-2.0-flash"
     
-    try:
-        # validate message length
-        if len(message) > settings.MAX_PROMPT_LENGTH:
-            logger.warning("message too long", length=len(message))
-            return PromptResponse(
-                success=False,
-                guardrail={"safe": False, "reason": "message exceeds maximum length"},
-                error="message too long"
-            )
-        
-        # run guardrail check with timeout on the current message
-        try:
-            guardrail_result = await asyncio.wait_for(
-                guardrail_service.check_prompt(message, api_key=chat_request.api_key.get_secret_value()),
-                timeout=settings.GUARDRAIL_TIMEOUT_SECONDS
-            )
-        except asyncio.TimeoutError:
-            logger.error("guardrail check timeout")
-            return PromptResponse(
-                success=False,
-                guardrail={"safe": False, "reason": "guardrail check timeout"},
-                error="security check timed out"
-            )
-        
-        # if guardrail fails, return 400
-        if not guardrail_result['safe']:
-            logger.warning("guardrail blocked message", reason=guardrail_result['reason'])
-            raise HTTPException(
-                status_code=400,
-                detail={
-                    "success": False,
-                    "guardrail": guardrail_result,
-                    "error": "message blocked by security guardrails"
-                }
-            )
-        
-        # guardrail passed, call gemini with conversation history
-        try:
-            response_text = await gemini_client.generate_chat(
-                message=message,
-                conversation_history=[
-                    {"role": msg.role, "content": msg.content}
-                    for msg in chat_request.conversation_history
-                ],
-                model=model,
-                timeout=settings.GEMINI_TIMEOUT_SECONDS,
-                api_key=chat_request.api_key.get_secret_value()
-            )
-            
-            logger.info("chat message processed successfully", model=model)
-            return PromptResponse(
-                success=True,
-                response=response_text,
-                guardrail=guardrail_result
-            )
-            
-        except ServiceUnavailableError:
-            logger.error("gemini service unavailable")
-            raise HTTPException(
-                status_code=503,
-                detail={
-                    "success": False,
-                    "guardrail": guardrail_result,
-                    "error": "gemini service temporarily unavailable"
-                }
-            )
-        
-        except asyncio.TimeoutError:
-            logger.error("gemini request timeout")
-            raise HTTPException(
-                status_code=504,
-                detail={
-                    "success": False,
-                    "guardrail": guardrail_result,
-                    "error": "gemini request timed out"
-                }
-            )
-        
-        except Exception as e:
-            logger.error("gemini request failed", error=str(e))
-            raise HTTPException(
-                status_code=500,
-                detail={
-                    "success": False,
-                    "guardrail": guardrail_result,
-                    "error": f"failed to generate response: {str(e)}"
-                }
-            )
+    # validate message length
+    if len(message) > settings.MAX_PROMPT_LENGTH:
+        logger.warning("message too long length=%d", len(message))
+        return PromptResponse.model_construct(
+            success=False,
+            guardrail={"safe": False, "reason": "message exceeds maximum length"},
+            error="message too long"
+        )
     
-    except HTTPException:
-        raise
+    # run guardrail check with timeout on the current message
+    completed, guardrail_result = await _run_guardrail(message, api_key)
+    if not completed:
+        return PromptResponse.model_construct(
+            success=False,
+            guardrail=guardrail_result,
+            error="security check timed out"
+        )
     
-    except Exception as e:
-        logger.error("unexpected error processing chat", error=str(e))
+    # if guardrail fails, return 400
+    if not guardrail_result['safe']:
+        logger.warning("guardrail blocked message reason=%s", guardrail_result['reason'])
         raise HTTPException(
-            status_code=500,
+            status_code=400,
             detail={
                 "success": False,
-                "guardrail": {"safe": False, "reason": "unexpected error"},
-                "error": f"internal error: {str(e)}"
+                "guardrail": guardrail_result,
+                "error": "message blocked by security guardrails"
             }
         )
+    
+    # guardrail passed, call gemini with conversation history
+    ok, outcome = await _run_gemini(
+        gemini_client.generate_chat(
+            message=message,
+            conversation_history=chat_request.conversation_history,
+            model=model,
+            timeout=settings.GEMINI_TIMEOUT_SECONDS,
+            api_key=api_key
+        )
+    )
+    if not ok:
+        raise _gemini_error(outcome, guardrail_result)
+    
+    logger.info("chat message processed successfully model=%s", model)
+    return PromptResponse.model_construct(
+        success=True,
+        response=outcome,
+        guardrail=guardrail_result
+    )
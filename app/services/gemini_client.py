@@ -1,16 +1,22 @@
 import asyncio
+import logging
 import time
-import threading
-from typing import Optional, List, Dict
-import structlog
-import google.generativeai as genai
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Sequence
+import httpx
+import orjson
 from google.api_core import exceptions as google_exceptions
 
+if TYPE_CHECKING:
+    from app.routers.prompt import ConversationMessage
 
-logger = structlog.get_logger()
 
-# Lock to serialize API key configuration and model usage
-_api_key_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+# gemini rest api, called directly so requests stay on the event loop
+_GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+
+# conversation roles -> gemini roles, gemini calls the assistant 'model'
+_ROLE_MAP = {"user": "user", "assistant": "model"}
 
 
 class ServiceUnavailableError(Exception):
@@ -30,6 +36,12 @@ class GeminiClient:
         self._max_failures = 3
         self._circuit_open = False
         
+        # shared connection pool - the api key is sent per request, so one
+        # client serves every user and keeps connections warm. created on
+        # first use so it binds to the running event loop, and again after
+        # aclose() if the app is started a second time
+        self._http: Optional[httpx.AsyncClient] = None
+        
         logger.info("gemini client initialized")
     
     async def generate(self, prompt: str, timeout: float, api_key: str) -> str:
@@ -47,67 +59,62 @@ class GeminiClient:
         raises:
             ServiceUnavailableError: if circuit breaker is open
             TimeoutError: if request times out
-            google_exceptions.InvalidArgument: for bad api key
-            google_exceptions.ResourceExhausted: for quota limits
+            google_exceptions.BadRequest: for bad api key or request
+            google_exceptions.TooManyRequests: for quota limits
         """
         # check circuit breaker
         if self._circuit_open:
             logger.error("circuit breaker is open, rejecting request")
             raise ServiceUnavailableError("service temporarily unavailable")
         
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         try:
-            def _generate_with_lock():
-                """Execute generation with lock to prevent API key race conditions"""
-                with _api_key_lock:
-                    genai.configure(api_key=api_key)
-                    model = genai.GenerativeModel('gemini-flash-latest')
-                    return model.generate_content(
-                        prompt,
-                        generation_config={'temperature': 0.7}
-                    )
-            
-            # use asyncio.wait_for for timeout handling
-            response = await asyncio.wait_for(
-                asyncio.to_thread(_generate_with_lock),
-                timeout=timeout
-            )
+            # overall deadline on top of httpx's per-operation timeouts
+            async with asyncio.timeout(timeout):
+                response_text = await self._generate_content(
+                    'gemini-flash-latest',
+                    [{"role": "user", "parts": [{"text": prompt}]}],
+                    timeout=timeout,
+                    api_key=api_key
+                )
             
             # reset circuit breaker on success
             self._consecutive_failures = 0
             
-            duration_ms = (time.time() - start_time) * 1000
-            logger.info("gemini request successful", duration_ms=duration_ms)
+            # only time the call when the line will be logged
+            if logger.isEnabledFor(logging.INFO):
+                duration_ms = (time.perf_counter() - start_time) * 1000.0
+                logger.info("gemini request successful duration_ms=%.1f", duration_ms)
             
-            return response.text
+            return response_text
             
-        except asyncio.TimeoutError:
+        except TimeoutError:
             self._handle_failure()
-            duration_ms = (time.time() - start_time) * 1000
-            logger.error("gemini request timeout", duration_ms=duration_ms)
+            duration_ms = (time.perf_counter() - start_time) * 1000.0
+            logger.error("gemini request timeout duration_ms=%.1f", duration_ms)
             raise
             
-        except google_exceptions.InvalidArgument as e:
+        except google_exceptions.BadRequest as e:
             self._handle_failure()
-            logger.error("invalid api key or bad request", error=str(e))
+            logger.error("invalid api key or bad request error=%s", e)
             raise
             
-        except google_exceptions.ResourceExhausted as e:
+        except google_exceptions.TooManyRequests as e:
             self._handle_failure()
-            logger.error("gemini quota exhausted", error=str(e))
+            logger.error("gemini quota exhausted error=%s", e)
             raise
             
         except Exception as e:
             self._handle_failure()
-            duration_ms = (time.time() - start_time) * 1000
-            logger.error("gemini request failed", error=str(e), duration_ms=duration_ms)
+            duration_ms = (time.perf_counter() - start_time) * 1000.0
+            logger.error("gemini request failed error=%s duration_ms=%.1f", e, duration_ms)
             raise
 
     async def generate_chat(
         self,
         message: str,
-        conversation_history: List[Dict[str, str]],
+        conversation_history: Sequence["ConversationMessage"],
         model: str,
         timeout: float,
         api_key: str
@@ -117,7 +124,7 @@ class GeminiClient:
         
         args:
             message: the current user message
-            conversation_history: list of previous messages with role and content
+            conversation_history: validated previous messages, used as-is
             model: the gemini model to use
             timeout: timeout in seconds
             api_key: the gemini api key to use
@@ -130,88 +137,143 @@ class GeminiClient:
             logger.error("circuit breaker is open, rejecting request")
             raise ServiceUnavailableError("service temporarily unavailable")
         
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         try:
-            def _generate_chat_with_lock():
-                """Execute chat generation with conversation history"""
-                with _api_key_lock:
-                    genai.configure(api_key=api_key)
-                    genai_model = genai.GenerativeModel(model)
-                    
-                    # build conversation history for gemini
-                    # Map roles: 'user' stays 'user', 'assistant' becomes 'model'
-                    history = []
-                    for msg in conversation_history:
-                        if msg["role"] == "user":
-                            role = "user"
-                        elif msg["role"] == "assistant":
-                            role = "model"
-                        else:
-                            # Skip messages with invalid roles
-                            logger.warning("skipping message with invalid role", role=msg["role"])
-                            continue
-                        history.append({
-                            "role": role,
-                            "parts": [msg["content"]]
-                        })
-                    
-                    # start chat with history
-                    chat = genai_model.start_chat(history=history)
-                    
-                    # send current message
-                    response = chat.send_message(
-                        message,
-                        generation_config={'temperature': 0.7}
-                    )
-                    
-                    return response
-            
-            # use asyncio.wait_for for timeout handling
-            response = await asyncio.wait_for(
-                asyncio.to_thread(_generate_chat_with_lock),
-                timeout=timeout
-            )
+            # build conversation history for gemini
+            contents = []
+            for msg in conversation_history:
+                role = _ROLE_MAP.get(msg.role)
+                if role is None:
+                    # Skip messages with invalid roles
+                    logger.warning("skipping message with invalid role role=%s", msg.role)
+                    continue
+                contents.append({
+                    "role": role,
+                    "parts": ({"text": msg.content},)
+                })
+            
+            # current message goes last
+            contents.append({"role": "user", "parts": [{"text": message}]})
+            
+            # overall deadline on top of httpx's per-operation timeouts
+            async with asyncio.timeout(timeout):
+                response_text = await self._generate_content(
+                    model, contents, timeout=timeout, api_key=api_key
+                )
             
             # reset circuit breaker on success
             self._consecutive_failures = 0
             
-            duration_ms = (time.time() - start_time) * 1000
-            logger.info("gemini chat request successful", duration_ms=duration_ms, model=model)
+            # only time the call when the line will be logged
+            if logger.isEnabledFor(logging.INFO):
+                duration_ms = (time.perf_counter() - start_time) * 1000.0
+                logger.info("gemini chat request successful duration_ms=%.1f model=%s", duration_ms, model)
             
-            return response.text
+            return response_text
             
-        except asyncio.TimeoutError:
+        except TimeoutError:
             self._handle_failure()
-            duration_ms = (time.time() - start_time) * 1000
-            logger.error("gemini chat request timeout", duration_ms=duration_ms)
+            duration_ms = (time.perf_counter() - start_time) * 1000.0
+            logger.error("gemini chat request timeout duration_ms=%.1f", duration_ms)
             raise
             
-        except google_exceptions.InvalidArgument as e:
+        except google_exceptions.BadRequest as e:
             self._handle_failure()
-            logger.error("invalid api key or bad request", error=str(e))
+            logger.error("invalid api key or bad request error=%s", e)
             raise
             
-        except google_exceptions.ResourceExhausted as e:
+        except google_exceptions.TooManyRequests as e:
             self._handle_failure()
-            logger.error("gemini quota exhausted", error=str(e))
+            logger.error("gemini quota exhausted error=%s", e)
             raise
             
         except Exception as e:
             self._handle_failure()
-            duration_ms = (time.time() - start_time) * 1000
-            logger.error("gemini chat request failed", error=str(e), duration_ms=duration_ms)
+            duration_ms = (time.perf_counter() - start_time) * 1000.0
+            logger.error("gemini chat request failed error=%s duration_ms=%.1f", e, duration_ms)
             raise
     
+    async def _generate_content(
+        self,
+        model: str,
+        contents: List[Dict[str, Any]],
+        timeout: float,
+        api_key: str
+    ) -> str:
+        """
+        call the generateContent rest endpoint and return the response text
+        
+        the key goes in the x-goog-api-key header rather than the url so it
+        never ends up in access logs. http errors are raised as the matching
+        google_exceptions class
+        """
+        response = await self._get_http().post(
+            f"{_GEMINI_API_BASE}/models/{model}:generateContent",
+            content=orjson.dumps({
+                "contents": contents,
+                "generationConfig": {"temperature": 0.7}
+            }),
+            headers={
+                "content-type": "application/json",
+                "x-goog-api-key": api_key
+            },
+            timeout=timeout
+        )
+        
+        if response.is_error:
+            try:
+                message = orjson.loads(response.content)["error"]["message"]
+            except Exception:
+                message = response.reason_phrase
+            raise google_exceptions.from_http_status(response.status_code, message)
+        
+        data = orjson.loads(response.content)
+        candidates = data.get("candidates")
+        if not candidates:
+            block_reason = data.get("promptFeedback", {}).get("blockReason", "unknown")
+            raise ValueError(f"gemini returned no candidates, block reason: {block_reason}")
+        
+        candidate = candidates[0]
+        texts = [
+            part["text"] for part in candidate.get("content", {}).get("parts", ())
+            if "text" in part
+        ]
+        if not texts:
+            # e.g. finishReason SAFETY - the candidate carries no content
+            finish_reason = candidate.get("finishReason", "unknown")
+            raise ValueError(f"gemini returned no text, finish reason: {finish_reason}")
+        
+        return "".join(texts)
+    
+    def _get_http(self) -> httpx.AsyncClient:
+        """
+        get the shared http connection pool, creating it if needed
+        """
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_connections=200, max_keepalive_connections=50)
+            )
+        return self._http
+    
+    async def aclose(self):
+        """
+        close the shared http connection pool, the next request opens a new one
+        """
+        if self._http is not None:
+            http, self._http = self._http, None
+            await http.aclose()
+    
     def _handle_failure(self):
         """
         handle failure and update circuit breaker state
         """
         self._consecutive_failures += 1
         logger.warning(
-            "gemini failure recorded",
-            consecutive_failures=self._consecutive_failures,
-            max_failures=self._max_failures
+            "gemini failure recorded consecutive_failures=%d max_failures=%d",
+            self._consecutive_failures,
+            self._max_failures
         )
         
         if self._consecutive_failures >= self._max_failures:
@@ -1,6 +1,8 @@
-import base64
 import re
+import string
 import unicodedata
+from typing import ClassVar, Dict
+from binascii import a2b_base64, Error as BinasciiError
 
 
 class Normalizer:
@@ -10,7 +12,7 @@ class Normalizer:
     """
     
     # leetspeak mapping
-    LEETSPEAK_MAP = {
+    LEETSPEAK_MAP: ClassVar[Dict[str, str]] = {
         '1': 'i',
         '3': 'e',
         '4': 'a',
@@ -18,34 +20,56 @@ class Normalizer:
         '5': 's',
         '7': 't',
     }
+    # translate table built once from the map, str.translate runs in c
+    _LEETSPEAK_TABLE: ClassVar[Dict[int, str]] = str.maketrans(LEETSPEAK_MAP)
+    # lowercase and leetspeak folded into one table, for ascii text
+    _ASCII_FOLD_TABLE: ClassVar[Dict[int, int]] = str.maketrans(
+        string.ascii_uppercase + ''.join(LEETSPEAK_MAP),
+        string.ascii_lowercase + ''.join(LEETSPEAK_MAP.values())
+    )
     
-    def __init__(self):
+    # shortest run base64_pattern can match
+    _BASE64_MIN_LENGTH: ClassVar[int] = 20
+    
+    def __init__(self) -> None:
         # compile regex patterns for efficiency
         self.base64_pattern = re.compile(r'[A-Za-z0-9+/]{20,}={0,2}')
         self.multi_space_pattern = re.compile(r'\s+')
+        # whitespace that _collapse_spaces would change - a run of two or
+        # more, or any single whitespace char other than a plain space
+        self.collapsible_space_pattern = re.compile(r'\s{2,}|[^\S ]')
     
     def normalize(self, text: str) -> str:
         """
         normalize text through multiple transformations
         returns cleaned, standardized text for security analysis
+        stages that can't change the text are skipped, so a short plain
+        ascii prompt only goes through a single translate()
         """
         if not text:
             return ""
         
         # step 1: decode any base64 strings
-        text = self._decode_base64(text)
-        
-        # step 2: convert to lowercase
-        text = text.lower()
-        
-        # step 3: convert leetspeak to normal characters
-        text = self._convert_leetspeak(text)
+        # runs before lower() since lowercasing corrupts base64
+        if len(text) >= self._BASE64_MIN_LENGTH:
+            text = self._decode_base64(text)
         
-        # step 4: normalize unicode homoglyphs to ascii
-        text = self._normalize_unicode(text)
+        if text.isascii():
+            # steps 2-3 in one pass, nfkd (step 4) leaves ascii text unchanged
+            text = text.translate(self._ASCII_FOLD_TABLE)
+        else:
+            # step 2: convert to lowercase
+            text = text.lower()
+            
+            # step 3: convert leetspeak to normal characters
+            text = self._convert_leetspeak(text)
+            
+            # step 4: normalize unicode homoglyphs to ascii
+            text = self._normalize_unicode(text)
         
         # step 5: collapse multiple spaces
-        text = self._collapse_spaces(text)
+        if self.collapsible_space_pattern.search(text):
+            text = self._collapse_spaces(text)
         
         return text.strip()
     
@@ -53,17 +77,25 @@ class Normalizer:
         """
         detect and decode base64 strings inline
         """
-        def decode_match(match):
+        def decode_match(match: re.Match[str]) -> str:
+            encoded = match.group(0)
+            # strict decoding needs whole blocks of 4 chars, either with the
+            # padding counted or (trailing padding being ignored) without it
+            if len(encoded) % 4 and len(encoded.rstrip('=')) % 4:
+                return encoded
             try:
-                encoded = match.group(0)
-                # try to decode as base64
-                decoded = base64.b64decode(encoded, validate=True).decode('utf-8', errors='ignore')
-                # only return decoded if it looks like text (printable chars)
-                if decoded and all(c.isprintable() or c.isspace() for c in decoded):
-                    return decoded
-            except Exception:
-                pass
-            return match.group(0)
+                decoded = a2b_base64(encoded, strict_mode=True).decode('utf-8', errors='ignore')
+            except BinasciiError:
+                return encoded
+            # only return decoded if it looks like text (printable chars or
+            # whitespace) - both checks run in c, the second only when the
+            # text has whitespace other than plain spaces
+            if decoded and (
+                decoded.isprintable()
+                or self.multi_space_pattern.sub('', decoded).isprintable()
+            ):
+                return decoded
+            return encoded
         
         return self.base64_pattern.sub(decode_match, text)
     
@@ -71,10 +103,7 @@ class Normalizer:
         """
         convert leetspeak characters to normal letters
         """
-        result = []
-        for char in text:
-            result.append(self.LEETSPEAK_MAP.get(char, char))
-        return ''.join(result)
+        return text.translate(self._LEETSPEAK_TABLE)
     
     def _normalize_unicode(self, text: str) -> str:
         """
@@ -85,7 +114,9 @@ class Normalizer:
         normalized = unicodedata.normalize('NFKD', text)
         # encode to ascii, ignoring non-ascii chars
         ascii_text = normalized.encode('ascii', 'ignore').decode('ascii')
-        return ascii_text
+        # nfkd can turn chars lower() left alone into ascii capitals
+        # (mathematical bold letters), keep the output lowercase
+        return ascii_text.lower()
     
     def _collapse_spaces(self, text: str) -> str:
         """
@@ -0,0 +1,59 @@
+from typing import Optional
+from limits.storage import MemoryStorage
+
+from app.config import settings
+
+
+class BoundedMemoryStorage(MemoryStorage):
+    """
+    in-memory rate limit storage with a hard cap on tracked client keys
+    
+    the stock memory storage only drops counters once their window expires,
+    so a scan from many source ips can grow it without bound. once the cap
+    is hit, the counter closest to expiring is evicted to make room
+    
+    registered with limits as boundedmemory://
+    """
+    
+    STORAGE_SCHEME = ["boundedmemory"]
+    
+    def __init__(self, uri: Optional[str] = None, max_keys: Optional[int] = None, **options):
+        self.max_keys = max_keys if max_keys is not None else settings.RATE_LIMIT_MAX_KEYS
+        super().__init__(uri, **options)
+    
+    def incr(self, key: str, *args, **kwargs) -> int:
+        """
+        increment a counter, evicting the oldest window if a new key would exceed the cap
+        used by the fixed-window and sliding-window-counter strategies
+        """
+        if key not in self.storage and len(self.storage) >= self.max_keys:
+            self._evict_oldest(self.expirations)
+        return super().incr(key, *args, **kwargs)
+    
+    def acquire_entry(self, key: str, *args, **kwargs) -> bool:
+        """
+        record a moving-window hit, evicting the least recently seen client if
+        a new key would exceed the cap
+        
+        expired events are dropped from the list but the key stays, so the
+        key is moved to the end on every hit to keep events ordered by last use
+        """
+        with self.locks[key]:
+            if key in self.events:
+                self.events[key] = self.events.pop(key)
+            elif len(self.events) >= self.max_keys:
+                self._evict_oldest(self.events)
+            return super().acquire_entry(key, *args, **kwargs)
+    
+    def _evict_oldest(self, entries: dict):
+        """
+        drop the first client in insertion order - for expirations a key is
+        only re-added once its window expires, so that is the window that
+        started first, and acquire_entry keeps events ordered by last hit
+        
+        reads MemoryStorage internals (storage, expirations, events), which is
+        why limits is pinned in requirements.txt
+        """
+        oldest_key = next(iter(entries), None)
+        if oldest_key is not None:
+            self.clear(oldest_key)